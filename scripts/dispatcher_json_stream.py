@@ -6,24 +6,52 @@ Run `codex exec` in JSON stream mode and echo events to the terminal.
 from __future__ import annotations
 
 import argparse
+import errno
+import functools
 import json
 import os
-import selectors
+import queue
+import select
+import shutil
 import subprocess
 import sys
+import threading
 import time
-from typing import Any, Iterable
+from typing import Any, Iterable, TextIO
 
 import yaml
 
+try:
+    from yaml import CSafeLoader as SafeLoader
+except ImportError:  # libyaml not available
+    from yaml import SafeLoader
+
 DEFAULT_PROMPT = "analyze the structure of the codebase"
 TASKS_STATE_PATH = "agents/context/tasks_state.yaml"
 MAX_REVIEW_ROUNDS = 3
+READ_CHUNK_SIZE = 64 * 1024
+JSON_DECODER = json.JSONDecoder()
+QUIET_EVENT_MARKERS = ('"item.completed"', '"turn.completed"')
 IMESSAGE_SCRIPT = os.path.join(os.path.dirname(__file__), "send_imessage.sh")
+IMESSAGE_READY = b"ready\n"
 
 ANSI_GREEN = "\033[32m"
 ANSI_BLUE = "\033[34m"
 ANSI_RESET = "\033[0m"
+TAG_COLORS = {"agent": ANSI_GREEN, "reasoning": ANSI_BLUE}
+
+# Long-lived `send_imessage.sh --stdin` process fed NUL-terminated messages.
+_IMESSAGE_WORKER: subprocess.Popen[bytes] | None = None
+_IMESSAGE_WORKER_FAILED = False
+# Notifications are delivered in order by one daemon thread draining this queue.
+_IMESSAGE_QUEUE: queue.Queue[str] = queue.Queue()
+_IMESSAGE_THREAD: threading.Thread | None = None
+
+# (epoch second, formatted timestamp) for the most recent log line.
+_TIMESTAMP_CACHE: tuple[int, bytes] = (-1, b"")
+
+# Parsed tasks_state.yaml keyed by path, revalidated against (mtime_ns, size).
+_TASKS_STATE_CACHE: dict[str, tuple[tuple[int, int], dict[str, Any]]] = {}
 
 
 def build_command(prompt: str) -> list[str]:
@@ -37,57 +65,68 @@ def build_command(prompt: str) -> list[str]:
     ]
 
 
+def format_item_started(payload: dict[str, Any]) -> tuple[str, str]:
+    item = payload.get("item", {})
+    item_type = item.get("type", "unknown")
+    cmd = item.get("command")
+    if item_type == "command_execution" and cmd:
+        return f"[command.start] {cmd}", "default"
+    return f"[item.start] {item_type}", "default"
+
+
+def format_item_completed(payload: dict[str, Any]) -> tuple[str, str]:
+    item = payload.get("item", {})
+    item_type = item.get("type", "unknown")
+    if item_type == "command_execution":
+        exit_code = item.get("exit_code")
+        return f"[command.done] exit={exit_code}", "default"
+    if item_type == "reasoning":
+        text = (item.get("text") or "").strip()
+        if text:
+            return f"[reasoning] {text}", "reasoning"
+        return "[reasoning]", "reasoning"
+    if item_type == "agent_message":
+        text = (item.get("text") or "").strip()
+        if text:
+            return f"[agent] {text}", "agent"
+        return "[agent]", "agent"
+    return f"[item.done] {item_type}", "default"
+
+
+def format_turn_completed(payload: dict[str, Any]) -> tuple[str, str]:
+    usage = payload.get("usage", {})
+    input_tokens = usage.get("input_tokens")
+    output_tokens = usage.get("output_tokens")
+    return f"[turn.done] input_tokens={input_tokens} output_tokens={output_tokens}", "default"
+
+
+EVENT_FORMATTERS = {
+    "item.started": format_item_started,
+    "item.completed": format_item_completed,
+    "turn.completed": format_turn_completed,
+}
+
+
 def format_event(payload: dict[str, Any]) -> tuple[str, str]:
     event_type = payload.get("type", "unknown")
-    if event_type == "item.started":
-        item = payload.get("item", {})
-        item_type = item.get("type", "unknown")
-        cmd = item.get("command")
-        if item_type == "command_execution" and cmd:
-            return f"[command.start] {cmd}", "default"
-        return f"[item.start] {item_type}", "default"
-    if event_type == "item.completed":
-        item = payload.get("item", {})
-        item_type = item.get("type", "unknown")
-        if item_type == "command_execution":
-            exit_code = item.get("exit_code")
-            return f"[command.done] exit={exit_code}", "default"
-        if item_type == "reasoning":
-            text = (item.get("text") or "").strip()
-            if text:
-                return f"[reasoning] {text}", "reasoning"
-            return "[reasoning]", "reasoning"
-        if item_type == "agent_message":
-            text = (item.get("text") or "").strip()
-            if text:
-                return f"[agent] {text}", "agent"
-            return "[agent]", "agent"
-        return f"[item.done] {item_type}", "default"
-    if event_type == "turn.completed":
-        usage = payload.get("usage", {})
-        input_tokens = usage.get("input_tokens")
-        output_tokens = usage.get("output_tokens")
-        return f"[turn.done] input_tokens={input_tokens} output_tokens={output_tokens}", "default"
-    return f"[event] {event_type}", "default"
+    formatter = EVENT_FORMATTERS.get(event_type)
+    if formatter is None:
+        return f"[event] {event_type}", "default"
+    return formatter(payload)
 
 
-def colorize(text: str, tag: str) -> str:
-    if tag == "agent":
-        return f"{ANSI_GREEN}{text}{ANSI_RESET}"
-    if tag == "reasoning":
-        return f"{ANSI_BLUE}{text}{ANSI_RESET}"
-    return text
+def use_color(stream: TextIO) -> bool:
+    return stream.isatty() and os.environ.get("NO_COLOR") is None
 
 
-def render_line(line: str) -> tuple[str, str, str | None]:
-    stripped = line.strip()
-    if not stripped:
-        return "", "default", None
-    try:
-        payload = json.loads(stripped)
-    except json.JSONDecodeError:
-        return stripped, "default", None
+def colorize(text: str, tag: str) -> str:
+    color = TAG_COLORS.get(tag)
+    if color is None:
+        return text
+    return f"{color}{text}{ANSI_RESET}"
 
+
+def render_event(payload: dict[str, Any]) -> tuple[str, str, str | None]:
     formatted, tag = format_event(payload)
     agent_text: str | None = None
     if payload.get("type") == "item.completed":
@@ -97,72 +136,150 @@ def render_line(line: str) -> tuple[str, str, str | None]:
     return formatted, tag, agent_text
 
 
-def stream_process(command: Iterable[str], prefix: str | None = None) -> tuple[int, str | None]:
+def render_line(line: str, quiet: bool = False) -> tuple[str, str, str | None]:
+    """Render one output line; with `quiet`, drop non-completion JSON undecoded."""
+    stripped = line.strip()
+    if not stripped:
+        return "", "default", None
+    if stripped[0] == "{":
+        if quiet and not any(marker in stripped for marker in QUIET_EVENT_MARKERS):
+            return "", "default", None
+        try:
+            payload, end = JSON_DECODER.raw_decode(stripped)
+        except json.JSONDecodeError:
+            pass
+        else:
+            if end == len(stripped):
+                return render_event(payload)
+    return stripped, "default", None
+
+
+def drain_lines(buffer: bytearray) -> list[str]:
+    lines: list[str] = []
+    start = 0
+    while True:
+        end = buffer.find(b"\n", start)
+        if end < 0:
+            break
+        lines.append(buffer[start:end].decode("utf-8", "replace"))
+        start = end + 1
+    del buffer[:start]
+    return lines
+
+
+def current_timestamp() -> bytes:
+    """Return the encoded `[local time] ` log stamp, formatting at most once per second."""
+    global _TIMESTAMP_CACHE
+    now = int(time.time())
+    if now != _TIMESTAMP_CACHE[0]:
+        stamp = time.strftime("[%Y-%m-%d %H:%M:%S] ", time.localtime(now))
+        _TIMESTAMP_CACHE = (now, stamp.encode())
+    return _TIMESTAMP_CACHE[1]
+
+
+@functools.lru_cache(maxsize=None)
+def resolve_executable(name: str) -> str:
+    """Resolve `name` on PATH so subprocess can use posix_spawn."""
+    resolved = shutil.which(name)
+    if resolved is None:
+        raise FileNotFoundError(errno.ENOENT, os.strerror(errno.ENOENT), name)
+    return resolved
+
+
+def stream_process(
+    command: Iterable[str],
+    prefix: str | None = None,
+    quiet: bool = False,
+) -> tuple[int, str | None]:
     last_agent_message: str | None = None
+    argv = list(command)
     try:
         proc = subprocess.Popen(
-            list(command),
+            argv,
+            executable=resolve_executable(argv[0]),
             stdout=subprocess.PIPE,
             stderr=subprocess.PIPE,
-            text=True,
-            bufsize=1,
+            bufsize=0,
+            close_fds=False,
         )
     except FileNotFoundError as exc:
         print(f"Required binary not found: {exc}. Ensure codex is installed.", file=sys.stderr)
-        return 127
-
-    selector = selectors.DefaultSelector()
-    if proc.stdout is not None:
-        selector.register(proc.stdout, selectors.EVENT_READ, data="stdout")
-    if proc.stderr is not None:
-        selector.register(proc.stderr, selectors.EVENT_READ, data="stderr")
-
-    while selector.get_map():
-        for key, _ in selector.select():
-            line = key.fileobj.readline()
-            if line == "":
-                selector.unregister(key.fileobj)
-                continue
-            formatted, tag, agent_text = render_line(line)
-            if not formatted:
-                continue
-            if agent_text:
-                last_agent_message = agent_text
-            timestamp = time.strftime("%Y-%m-%d %H:%M:%S")
-            if prefix:
-                output = f"{prefix} [{timestamp}] {colorize(formatted, tag)}\n"
-            else:
-                output = f"[{timestamp}] {colorize(formatted, tag)}\n"
-            if key.data == "stderr":
-                sys.stderr.write(output)
-                sys.stderr.flush()
+        return 127, None
+
+    poller = select.poll()
+    streams: dict[int, str] = {}
+    for stream, pipe in (("stdout", proc.stdout), ("stderr", proc.stderr)):
+        if pipe is not None:
+            poller.register(pipe.fileno(), select.POLLIN | select.POLLHUP)
+            streams[pipe.fileno()] = stream
+    buffers = {"stdout": bytearray(), "stderr": bytearray()}
+    read_buffer = bytearray(READ_CHUNK_SIZE)
+    read_view = memoryview(read_buffer)
+    prefix_bytes = f"{prefix} ".encode() if prefix else b""
+    # Log lines go straight to the binary buffers; flush anything already
+    # printed through the text layers so ordering is preserved.
+    sys.stdout.flush()
+    sys.stderr.flush()
+    outputs = {"stdout": sys.stdout.buffer, "stderr": sys.stderr.buffer}
+    colored = {"stdout": use_color(sys.stdout), "stderr": use_color(sys.stderr)}
+
+    while streams:
+        for fd, _ in poller.poll():
+            stream = streams[fd]
+            buffer = buffers[stream]
+            size = os.readv(fd, [read_buffer])
+            if size == 0:
+                poller.unregister(fd)
+                del streams[fd]
+                lines = [buffer.decode("utf-8", "replace")] if buffer else []
+                buffer.clear()
             else:
-                sys.stdout.write(output)
-                sys.stdout.flush()
+                scanned = len(buffer)
+                buffer += read_view[:size]
+                # Only the new bytes can complete a line; skip rescanning the rest.
+                if buffer.find(b"\n", scanned) < 0:
+                    continue
+                lines = drain_lines(buffer)
+            for line in lines:
+                formatted, tag, agent_text = render_line(line, quiet=quiet)
+                if not formatted:
+                    continue
+                if agent_text:
+                    last_agent_message = agent_text
+                if colored[stream]:
+                    formatted = colorize(formatted, tag)
+                output = outputs[stream]
+                output.write(
+                    prefix_bytes
+                    + current_timestamp()
+                    + formatted.encode("utf-8", "replace")
+                    + b"\n"
+                )
+                output.flush()
 
     return proc.wait(), last_agent_message
 
 
 def load_tasks_state(path: str) -> dict[str, Any]:
-    with open(path, "r", encoding="utf-8") as handle:
-        data = yaml.safe_load(handle) or {}
+    stat = os.stat(path)
+    signature = (stat.st_mtime_ns, stat.st_size)
+    cached = _TASKS_STATE_CACHE.get(path)
+    if cached is not None and cached[0] == signature:
+        return cached[1]
+    with open(path, "rb") as handle:
+        data = yaml.load(handle, Loader=SafeLoader) or {}
     if not isinstance(data, dict):
         raise ValueError(f"Invalid tasks state structure in {path}")
+    _TASKS_STATE_CACHE[path] = (signature, data)
     return data
 
 
-def task_ids_from_state(path: str) -> list[str]:
+def task_ids_from_state(path: str) -> tuple[list[str], dict[str, Any]]:
     data = load_tasks_state(path)
-    task_ids: list[str] = []
-    for key in data.keys():
-        if key == "schema_version":
-            continue
-        task_ids.append(key)
-    return task_ids
+    return [key for key in data if key != "schema_version"], data
 
 
-def task_status(path: str, task_id: str) -> str | None:
-    data = load_tasks_state(path)
+def status_from_state(data: dict[str, Any], task_id: str) -> str | None:
     entry = data.get(task_id)
     if not isinstance(entry, dict):
         return None
@@ -172,6 +289,10 @@ def task_status(path: str, task_id: str) -> str | None:
     return None
 
 
+def task_status(path: str, task_id: str) -> str | None:
+    return status_from_state(load_tasks_state(path), task_id)
+
+
 def build_executor_prompt(task_id: str, feedback: str | None = None) -> str:
     repo_path = os.getcwd()
     base = (
@@ -198,6 +319,7 @@ def run_codex(
     prompt: str,
     task_id: str | None = None,
     role: str | None = None,
+    quiet: bool = False,
 ) -> tuple[int, str | None]:
     command = build_command(prompt)
     print(f"Running: {' '.join(command)}")
@@ -208,13 +330,14 @@ def run_codex(
         prefix = f"[{task_id}]"
     elif role:
         prefix = f"[{role}]"
-    return stream_process(command, prefix=prefix)
+    return stream_process(command, prefix=prefix, quiet=quiet)
 
 
 def run_scheduler(
     task_ids: list[str],
     tasks_state_path: str,
     max_rounds: int,
+    quiet: bool = False,
 ) -> int:
     for task_id in task_ids:
         print(f"Starting task {task_id}")
@@ -226,6 +349,7 @@ def run_scheduler(
                 executor_prompt,
                 task_id=task_id,
                 role="executor",
+                quiet=quiet,
             )
             if exit_code != 0:
                 print(f"Interrupted: executor exited with code {exit_code}", file=sys.stderr)
@@ -245,6 +369,7 @@ def run_scheduler(
                 reviewer_prompt,
                 task_id=task_id,
                 role="reviewer",
+                quiet=quiet,
             )
             if exit_code != 0:
                 print(f"Interrupted: reviewer exited with code {exit_code}", file=sys.stderr)
@@ -276,19 +401,92 @@ def run_scheduler(
     return 0
 
 
+def start_imessage_worker() -> subprocess.Popen[bytes] | None:
+    global _IMESSAGE_WORKER, _IMESSAGE_WORKER_FAILED
+    if _IMESSAGE_WORKER is not None and _IMESSAGE_WORKER.poll() is None:
+        return _IMESSAGE_WORKER
+    if _IMESSAGE_WORKER_FAILED:
+        return None
+    worker = subprocess.Popen(
+        [IMESSAGE_SCRIPT, "--stdin"],
+        executable=resolve_executable(IMESSAGE_SCRIPT),
+        stdin=subprocess.PIPE,
+        stdout=subprocess.PIPE,
+        close_fds=False,
+    )
+    greeting = worker.stdout.readline()
+    worker.stdout.close()
+    if greeting != IMESSAGE_READY:
+        worker.stdin.close()
+        worker.wait()
+        _IMESSAGE_WORKER_FAILED = True
+        detail = greeting.decode("utf-8", "replace").strip() or f"exit code {worker.returncode}"
+        print(
+            f"Warning: {IMESSAGE_SCRIPT} --stdin did not start ({detail}); skipping iMessage sends.",
+            file=sys.stderr,
+        )
+        return None
+    _IMESSAGE_WORKER = worker
+    return worker
+
+
+def stop_imessage_worker() -> None:
+    global _IMESSAGE_WORKER
+    if _IMESSAGE_WORKER is None:
+        return
+    if _IMESSAGE_WORKER.stdin is not None:
+        try:
+            _IMESSAGE_WORKER.stdin.close()
+        except BrokenPipeError:
+            pass
+    _IMESSAGE_WORKER.wait()
+    _IMESSAGE_WORKER = None
+
+
+def deliver_imessage(payload: str) -> None:
+    try:
+        worker = start_imessage_worker()
+    except FileNotFoundError:
+        print(f"Warning: {IMESSAGE_SCRIPT} not found; skipping iMessage send.", file=sys.stderr)
+        return
+    if worker is None or worker.stdin is None:
+        return
+    try:
+        worker.stdin.write(payload.replace("\0", "").encode("utf-8") + b"\0")
+        worker.stdin.flush()
+    except BrokenPipeError:
+        stop_imessage_worker()
+        print("Warning: iMessage worker exited; message not sent.", file=sys.stderr)
+
+
+def imessage_sender_loop() -> None:
+    while True:
+        payload = _IMESSAGE_QUEUE.get()
+        try:
+            deliver_imessage(payload)
+        except Exception as exc:  # noqa: BLE001 - a failed notification must not stop the queue
+            print(f"Warning: iMessage send failed: {exc!r}", file=sys.stderr)
+        finally:
+            _IMESSAGE_QUEUE.task_done()
+
+
 def send_imessage(role: str, task_id: str, status: str | None, response: str | None) -> None:
+    """Queue a notification for the background sender; never blocks on delivery."""
+    global _IMESSAGE_THREAD
     message_status = status or "unknown"
     response_text = response or "No agent response captured."
     payload = f"[{role}] [{task_id}] ({message_status}): {response_text}"
-    try:
-        subprocess.run(
-            [IMESSAGE_SCRIPT, payload],
-            check=False,
-            text=True,
-            capture_output=True,
-        )
-    except FileNotFoundError:
-        print(f"Warning: {IMESSAGE_SCRIPT} not found; skipping iMessage send.", file=sys.stderr)
+    if _IMESSAGE_THREAD is None or not _IMESSAGE_THREAD.is_alive():
+        _IMESSAGE_THREAD = threading.Thread(target=imessage_sender_loop, daemon=True)
+        _IMESSAGE_THREAD.start()
+    _IMESSAGE_QUEUE.put(payload)
+
+
+def flush_imessages() -> None:
+    """Wait for queued notifications to be delivered, then stop the worker."""
+    if _IMESSAGE_THREAD is not None and _IMESSAGE_THREAD.is_alive():
+        _IMESSAGE_QUEUE.join()
+    stop_imessage_worker()
 
 
 def main() -> int:
@@ -321,6 +519,14 @@ def main() -> int:
         default=MAX_REVIEW_ROUNDS,
         help="Maximum executor-reviewer rounds per task.",
     )
+    parser.add_argument(
+        "--quiet",
+        action="store_true",
+        help=(
+            "Only print completed items, turn summaries, and lines that do not "
+            "start with '{'; other JSON-looking lines are dropped undecoded."
+        ),
+    )
     args = parser.parse_args()
 
     if args.all and args.tasks:
@@ -329,20 +535,23 @@ def main() -> int:
 
     if args.all or args.tasks:
         if args.all:
-            ordered_ids = task_ids_from_state(args.tasks_state)
+            ordered_ids, state = task_ids_from_state(args.tasks_state)
             task_ids = [
                 task_id
                 for task_id in ordered_ids
-                if task_status(args.tasks_state, task_id) != "done"
+                if status_from_state(state, task_id) != "done"
             ]
         else:
             task_ids = list(args.tasks or [])
         if not task_ids:
             print("No tasks to run.")
             return 0
-        return run_scheduler(task_ids, args.tasks_state, args.max_rounds)
+        try:
+            return run_scheduler(task_ids, args.tasks_state, args.max_rounds, quiet=args.quiet)
+        finally:
+            flush_imessages()
 
-    exit_code, _ = run_codex(args.prompt)
+    exit_code, _ = run_codex(args.prompt, quiet=args.quiet)
     return exit_code
 
 
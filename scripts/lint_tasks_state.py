@@ -3,15 +3,22 @@
 
 from __future__ import annotations
 
+import argparse
 import re
 import sys
+from collections import Counter
 from pathlib import Path
 
 import yaml
 
+try:
+    from yaml import CSafeLoader as SafeLoader
+except ImportError:  # libyaml not available
+    from yaml import SafeLoader
 
-TASK_ID_RE = re.compile(r"^T-\d{3}$")
-ALLOWED_STATUSES = {
+
+TASK_ID_RE = re.compile(r"^T-\d{3}$", re.ASCII)
+ALLOWED_STATUSES = frozenset({
     "backlog",
     "ready",
     "in_progress",
@@ -22,21 +29,52 @@ ALLOWED_STATUSES = {
     "request_changes",
     "escalation_needed",
     "done",
-}
-EARLY_STATUSES = {"backlog", "ready", "blocked"}
-REVIEW_STATUSES = {
+})
+EARLY_STATUSES = frozenset({"backlog", "ready", "blocked"})
+REVIEW_STATUSES = frozenset({
     "ready_for_review",
     "review_in_progress",
     "review_clean",
     "request_changes",
     "escalation_needed",
+})
+TASK_STATE_KEYS = frozenset({"status", "pr", "merged"})
+# (statuses, pr rule, required merged value); pr rule is "null", "null_or_positive",
+# or "positive".
+STATUS_RULE_TABLE = (
+    (EARLY_STATUSES, "null", False),
+    (frozenset({"in_progress"}), "null_or_positive", False),
+    (REVIEW_STATUSES, "positive", False),
+    (frozenset({"done"}), "positive", True),
+)
+STATUS_RULES = {
+    status: (pr_rule, merged)
+    for statuses, pr_rule, merged in STATUS_RULE_TABLE
+    for status in statuses
 }
-TASK_STATE_KEYS = {"status", "pr", "merged"}
+
+
+class ErrorList(list):
+    """Collected lint errors; with `fast_fail`, report and exit on the first one."""
+
+    def __init__(self, fast_fail: bool = False) -> None:
+        super().__init__()
+        self.fast_fail = fast_fail
+
+    def append(self, error: tuple) -> None:
+        super().append(error)
+        if self.fast_fail:
+            sys.stdout.write(format_errors(self))
+            raise SystemExit(1)
+
+
+def format_errors(errors: list[tuple]) -> str:
+    return "".join(f"ERROR: {template.format(*args)}\n" for template, *args in errors)
 
 
 def load_yaml(path: Path) -> dict:
-    with path.open("r", encoding="utf-8") as handle:
-        data = yaml.safe_load(handle)
+    with path.open("rb") as handle:
+        data = yaml.load(handle, Loader=SafeLoader)
     if data is None:
         return {}
     if not isinstance(data, dict):
@@ -45,77 +83,175 @@ def load_yaml(path: Path) -> dict:
 
 
 def collect_task_ids(
-    tasks: list, label: str, errors: list[str]
+    tasks: list, label: str, errors: list[tuple]
 ) -> tuple[list[str], dict[str, list[str]]]:
     ids: list[str] = []
     dependencies: dict[str, list[str]] = {}
     if not isinstance(tasks, list):
-        errors.append(f"{label} must be a list.")
+        errors.append(("{} must be a list.", label))
         return ids, dependencies
     for index, task in enumerate(tasks):
         if not isinstance(task, dict):
-            errors.append(f"{label}[{index}] must be a mapping.")
+            errors.append(("{}[{}] must be a mapping.", label, index))
             continue
         task_id = task.get("id")
         if not isinstance(task_id, str):
-            errors.append(f"{label}[{index}].id must be a string.")
+            errors.append(("{}[{}].id must be a string.", label, index))
             continue
         if not TASK_ID_RE.match(task_id):
-            errors.append(f"{label}[{index}].id '{task_id}' must match T-000 format.")
+            errors.append(
+                ("{}[{}].id '{}' must match T-000 format.", label, index, task_id)
+            )
         depends_on = task.get("depends_on")
         if depends_on is not None:
             if not isinstance(depends_on, list):
-                errors.append(f"{label}[{index}].depends_on must be a list.")
+                errors.append(("{}[{}].depends_on must be a list.", label, index))
             else:
                 deps: list[str] = []
                 seen_deps: set[str] = set()
                 for dep in depends_on:
                     if not isinstance(dep, str):
                         errors.append(
-                            f"{label}[{index}].depends_on values must be strings."
+                            ("{}[{}].depends_on values must be strings.", label, index)
                         )
                         continue
                     if not TASK_ID_RE.match(dep):
                         errors.append(
-                            f"{label}[{index}].depends_on '{dep}' must match T-000 format."
+                            (
+                                "{}[{}].depends_on '{}' must match T-000 format.",
+                                label,
+                                index,
+                                dep,
+                            )
                         )
                     if dep in seen_deps:
                         errors.append(
-                            f"{label}[{index}].depends_on contains duplicate '{dep}'."
+                            (
+                                "{}[{}].depends_on contains duplicate '{}'.",
+                                label,
+                                index,
+                                dep,
+                            )
                         )
                         continue
                     seen_deps.add(dep)
                     deps.append(dep)
                 if task_id in seen_deps:
                     errors.append(
-                        f"{label}[{index}].depends_on cannot include itself."
+                        ("{}[{}].depends_on cannot include itself.", label, index)
                     )
                 dependencies[task_id] = deps
         ids.append(task_id)
     return ids, dependencies
 
 
+def check_task_state(task_id: str, state: object, errors: list[tuple]) -> None:
+    if not isinstance(state, dict):
+        errors.append(("tasks_state.yaml entry for '{}' must be a mapping.", task_id))
+        return
+    extra_keys = state.keys() - TASK_STATE_KEYS
+    missing_keys = TASK_STATE_KEYS - state.keys()
+    if extra_keys:
+        errors.append(
+            (
+                "tasks_state.yaml entry for '{}' has unexpected keys: {}.",
+                task_id,
+                ", ".join(sorted(map(str, extra_keys))),
+            )
+        )
+    if missing_keys:
+        errors.append(
+            (
+                "tasks_state.yaml entry for '{}' is missing keys: {}.",
+                task_id,
+                ", ".join(sorted(missing_keys)),
+            )
+        )
+    status = state.get("status")
+    pr_value = state.get("pr")
+    merged_value = state.get("merged")
+
+    if not isinstance(status, str):
+        errors.append(("tasks_state.yaml status for '{}' must be a string.", task_id))
+    elif status not in ALLOWED_STATUSES:
+        errors.append(
+            ("tasks_state.yaml status '{}' for '{}' is invalid.", status, task_id)
+        )
+
+    if pr_value is None:
+        pr_is_set = False
+    elif isinstance(pr_value, int):
+        if pr_value < 0:
+            errors.append(
+                (
+                    "tasks_state.yaml pr for '{}' must be a non-negative integer.",
+                    task_id,
+                )
+            )
+        pr_is_set = pr_value > 0
+    else:
+        errors.append(
+            (
+                "tasks_state.yaml pr for '{}' must be null or a non-negative integer.",
+                task_id,
+            )
+        )
+        pr_is_set = False
+
+    if not isinstance(merged_value, bool):
+        errors.append(("tasks_state.yaml merged for '{}' must be a boolean.", task_id))
+
+    rule = STATUS_RULES.get(status) if isinstance(status, str) else None
+    if rule is None:
+        return
+    pr_rule, merged_expected = rule
+    if pr_rule == "null":
+        if pr_value is not None:
+            errors.append(
+                ("tasks_state.yaml pr for '{}' must be null in '{}'.", task_id, status)
+            )
+    elif not pr_is_set and (pr_rule == "positive" or pr_value is not None):
+        errors.append(
+            (
+                "tasks_state.yaml pr for '{}' must be a positive integer in '{}'.",
+                task_id,
+                status,
+            )
+        )
+    if merged_value is not merged_expected:
+        errors.append(
+            (
+                "tasks_state.yaml merged for '{}' must be {} in '{}'.",
+                task_id,
+                "true" if merged_expected else "false",
+                status,
+            )
+        )
+
+
 def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument(
+        "--fast-fail",
+        action="store_true",
+        help="Stop at the first error instead of reporting all of them.",
+    )
+    args = parser.parse_args()
+
     repo_root = Path(__file__).resolve().parents[1]
     tasks_path = repo_root / "agents/context/tasks.yaml"
     state_path = repo_root / "agents/context/tasks_state.yaml"
 
-    errors: list[str] = []
+    errors = ErrorList(fast_fail=args.fast_fail)
 
     try:
         tasks_data = load_yaml(tasks_path)
     except Exception as exc:  # noqa: BLE001 - keep CLI output simple
-        errors.append(str(exc))
+        errors.append(("{}", exc))
         tasks_data = {}
 
-    try:
-        state_data = load_yaml(state_path)
-    except Exception as exc:  # noqa: BLE001 - keep CLI output simple
-        errors.append(str(exc))
-        state_data = {}
-
     if tasks_data.get("schema_version") != 2:
-        errors.append(f"{tasks_path} schema_version must be 2.")
+        errors.append(("{} schema_version must be 2.", tasks_path))
 
     current_sprint = tasks_data.get("current_sprint", [])
     backlog = tasks_data.get("backlog", [])
@@ -126,128 +262,59 @@ def main() -> int:
     active_ids = current_ids + backlog_ids
     active_deps = {**current_deps, **backlog_deps}
 
-    seen_ids: set[str] = set()
-    for task_id in active_ids:
-        if task_id in seen_ids:
-            errors.append(f"Duplicate task id '{task_id}' in tasks.yaml.")
-        seen_ids.add(task_id)
+    active = set(active_ids)
+    if len(active) != len(active_ids):
+        for task_id, count in Counter(active_ids).items():
+            if count > 1:
+                errors.append(("Duplicate task id '{}' in tasks.yaml.", task_id))
     for task_id, deps in active_deps.items():
         for dep in deps:
-            if dep not in seen_ids:
+            if dep not in active:
                 errors.append(
-                    f"tasks.yaml task '{task_id}' depends_on inactive or missing task '{dep}'."
+                    (
+                        "tasks.yaml task '{}' depends_on inactive or missing task '{}'.",
+                        task_id,
+                        dep,
+                    )
                 )
 
-    if state_data.get("schema_version") != 2:
-        errors.append(f"{state_path} schema_version must be 2.")
+    try:
+        state_data = load_yaml(state_path)
+    except Exception as exc:  # noqa: BLE001 - keep CLI output simple
+        errors.append(("{}", exc))
+        state_data = {}
 
-    task_states: dict[str, dict] = {}
+    state_ids: set[str] = set()
     for task_id, payload in state_data.items():
         if task_id == "schema_version":
             continue
         if not isinstance(task_id, str):
-            errors.append("tasks_state.yaml task keys must be strings.")
+            errors.append(("tasks_state.yaml task keys must be strings.",))
             continue
         if not TASK_ID_RE.match(task_id):
-            errors.append(f"tasks_state.yaml task id '{task_id}' must match T-000 format.")
-            continue
-        task_states[task_id] = payload
-
-    for task_id, state in task_states.items():
-        if task_id not in seen_ids:
             errors.append(
-                f"tasks_state.yaml includes inactive task '{task_id}'; "
-                "only active tasks in tasks.yaml are allowed."
+                ("tasks_state.yaml task id '{}' must match T-000 format.", task_id)
             )
-        if not isinstance(state, dict):
-            errors.append(f"tasks_state.yaml entry for '{task_id}' must be a mapping.")
             continue
-        extra_keys = set(state.keys()) - TASK_STATE_KEYS
-        missing_keys = TASK_STATE_KEYS - set(state.keys())
-        if extra_keys:
-            errors.append(
-                f"tasks_state.yaml entry for '{task_id}' has unexpected keys: "
-                f"{', '.join(sorted(extra_keys))}."
-            )
-        if missing_keys:
-            errors.append(
-                f"tasks_state.yaml entry for '{task_id}' is missing keys: "
-                f"{', '.join(sorted(missing_keys))}."
-            )
-        status = state.get("status")
-        pr_value = state.get("pr")
-        merged_value = state.get("merged")
+        state_ids.add(task_id)
+        check_task_state(task_id, payload, errors)
 
-        if not isinstance(status, str):
-            errors.append(f"tasks_state.yaml status for '{task_id}' must be a string.")
-        elif status not in ALLOWED_STATUSES:
-            errors.append(
-                f"tasks_state.yaml status '{status}' for '{task_id}' is invalid."
-            )
-
-        if pr_value is None:
-            pr_is_set = False
-        elif isinstance(pr_value, int):
-            if pr_value < 0:
-                errors.append(
-                    f"tasks_state.yaml pr for '{task_id}' must be a non-negative integer."
-                )
-            pr_is_set = pr_value > 0
-        else:
-            errors.append(
-                f"tasks_state.yaml pr for '{task_id}' must be null or a non-negative integer."
-            )
-            pr_is_set = False
+    if state_data.get("schema_version") != 2:
+        errors.append(("{} schema_version must be 2.", state_path))
 
-        if not isinstance(merged_value, bool):
-            errors.append(
-                f"tasks_state.yaml merged for '{task_id}' must be a boolean."
+    for task_id in sorted(state_ids - active):
+        errors.append(
+            (
+                "tasks_state.yaml includes inactive task '{}'; "
+                "only active tasks in tasks.yaml are allowed.",
+                task_id,
             )
-
-        if isinstance(status, str) and status in EARLY_STATUSES:
-            if pr_value is not None:
-                errors.append(
-                    f"tasks_state.yaml pr for '{task_id}' must be null in '{status}'."
-                )
-            if merged_value is not False:
-                errors.append(
-                    f"tasks_state.yaml merged for '{task_id}' must be false in '{status}'."
-                )
-        if isinstance(status, str) and status == "in_progress":
-            if pr_value is not None and not pr_is_set:
-                errors.append(
-                    f"tasks_state.yaml pr for '{task_id}' must be a positive integer in '{status}'."
-                )
-            if merged_value is not False:
-                errors.append(
-                    f"tasks_state.yaml merged for '{task_id}' must be false in '{status}'."
-                )
-        if isinstance(status, str) and status in REVIEW_STATUSES:
-            if not pr_is_set:
-                errors.append(
-                    f"tasks_state.yaml pr for '{task_id}' must be a positive integer in '{status}'."
-                )
-            if merged_value is not False:
-                errors.append(
-                    f"tasks_state.yaml merged for '{task_id}' must be false in '{status}'."
-                )
-        if isinstance(status, str) and status == "done":
-            if not pr_is_set:
-                errors.append(
-                    f"tasks_state.yaml pr for '{task_id}' must be a positive integer in 'done'."
-                )
-            if merged_value is not True:
-                errors.append(
-                    f"tasks_state.yaml merged for '{task_id}' must be true in 'done'."
-                )
-
-    for task_id in seen_ids:
-        if task_id not in task_states:
-            errors.append(f"tasks_state.yaml is missing entry for '{task_id}'.")
+        )
+    for task_id in sorted(active - state_ids):
+        errors.append(("tasks_state.yaml is missing entry for '{}'.", task_id))
 
     if errors:
-        for error in errors:
-            print(f"ERROR: {error}")
+        sys.stdout.write(format_errors(errors))
         return 1
 
     print("OK: tasks.yaml and tasks_state.yaml are consistent.")
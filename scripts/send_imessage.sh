@@ -13,6 +13,35 @@ fi
 
 default_to="${IMESSAGE_TO:-}"
 
+send_message() {
+  local to_escaped=${1//"/\\"}
+  local msg_escaped=${2//"/\\"}
+
+  osascript <<APPLESCRIPT
+tell application "Messages"
+  set targetService to 1st service whose service type = iMessage
+  set targetBuddy to buddy "$to_escaped" of targetService
+  send "$msg_escaped" to targetBuddy
+end tell
+APPLESCRIPT
+}
+
+# --stdin: stay alive and send each NUL-terminated message read from stdin.
+if [[ "${1:-}" == "--stdin" ]]; then
+  to="${2:-$default_to}"
+  if [[ -z "$to" ]]; then
+    echo "Usage: $0 --stdin [phone_or_email] < messages"
+    exit 1
+  fi
+  # Handshake for the dispatcher, then keep osascript output off the pipe.
+  echo ready
+  exec >/dev/null
+  while IFS= read -r -d '' msg; do
+    send_message "$to" "$msg" || echo "Failed to send message." >&2
+  done
+  exit 0
+fi
+
 if [[ -n "${default_to}" && -n "${1:-}" && -z "${2:-}" ]]; then
   to="$default_to"
   msg="$1"
@@ -26,13 +55,4 @@ if [[ -z "$to" || -z "$msg" ]]; then
   exit 1
 fi
 
-to_escaped=${to//"/\\"}
-msg_escaped=${msg//"/\\"}
-
-osascript <<APPLESCRIPT
-tell application "Messages"
-  set targetService to 1st service whose service type = iMessage
-  set targetBuddy to buddy "$to_escaped" of targetService
-  send "$msg_escaped" to targetBuddy
-end tell
-APPLESCRIPT
+send_message "$to" "$msg"